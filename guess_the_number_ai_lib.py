@@ -4,15 +4,15 @@ by Mateusz Bysiek
 """
 
 import collections
+import concurrent.futures
 import enum
 import functools
-import math
-import operator
 import random
+import time
 import typing
 
+import matplotlib.pyplot as plt
 import numpy as np
-import pylab
 
 
 class Hint(enum.Enum):
@@ -27,6 +27,13 @@ class Hint(enum.Enum):
     Higher = '+'
 
 
+# hints as integers, i.e. signs of the difference between the number to guess and the guess
+_HINT_SIGNS = {Hint.Lower: -1, Hint.Hit: 0, Hint.Higher: 1}
+
+# hints indexed by their signs, -1 being the last index
+_HINTS_BY_SIGN = (Hint.Hit, Hint.Higher, Hint.Lower)
+
+
 class GuessingGame:
 
     """Guessing game.
@@ -34,8 +41,11 @@ class GuessingGame:
     This class is predefined - do not change it.
     """
 
-    def __init__(self, range_min: int, range_max: int, testing: bool = False):
-        """Initialize a new guessing game."""
+    def __init__(self, range_min: int, range_max: int, testing: bool = False, secret: int = None):
+        """Initialize a new guessing game.
+
+        The number to guess is random, unless it is given as secret.
+        """
         assert isinstance(range_min, int), 'lower bound of the number range must be an integer'
         assert isinstance(range_max, int), 'upper bound of the number range must be an integer'
         assert range_min < range_max, 'lower bound must be lower than upper bound'
@@ -43,10 +53,19 @@ class GuessingGame:
 
         self._range_min = range_min
         self._range_max = range_max
-        self._number = random.randrange(range_min, range_max)
+        self._number = self._prepare_secret(secret)
         self._state = None  # type: Hint
         self._testing = testing
 
+    def _prepare_secret(self, secret: typing.Optional[int]) -> int:
+        """Return given number to guess after validating it, or a new random one if not given."""
+        if secret is None:
+            return random.randrange(self._range_min, self._range_max)
+        assert isinstance(secret, int), 'the number to guess must be an integer'
+        assert self._range_min <= secret < self._range_max, (
+            'the number to guess must be within the range')
+        return secret
+
     def number_range(self) -> typing.Tuple[int, int]:
         """Return tuple (min, max) that describes range of the number to guess."""
         return (self._range_min, self._range_max)
@@ -59,33 +78,37 @@ class GuessingGame:
         """Return True if game is over, False otherwise."""
         return self._state is Hint.Hit
 
+    def reset(self, secret: int = None) -> None:
+        """Start the game over, with given number to guess or with a new random one."""
+        self._number = self._prepare_secret(secret)
+        self._state = None
+
     def change_number(self) -> None:
         """Do nothing... yet."""
         pass
 
     def guess(self, number: int) -> Hint:
         """Compare given number to internally stored one, and return a hint about its value."""
-        if not self._testing:
-            print('{}?'.format(number))
+        if self._testing:
+            return self._guess_core(number)
+
+        print('{}?'.format(number))
+        state = self._guess_core(number)
+        print(state)
+        return state
 
+    def _guess_core(self, number: int) -> Hint:
+        """Do the same as guess(), but without printing anything."""
         if self._state is Hint.Hit:
             raise RuntimeError('you shoud not keep guessing after you guessed correctly')
 
+        range_min, range_max, secret = self._range_min, self._range_max, self._number
         assert isinstance(number, int), 'your guess must be an integer'
-        assert number in range(self._range_min, self._range_max), (
+        assert range_min <= number < range_max, (
             'your guess {} is outside the valid range <{},{})'
-            .format(number, self._range_min, self._range_max))
-
-        if self._number == number:
-            self._state = Hint.Hit
-        elif self._number > number:
-            self._state = Hint.Higher
-        elif self._number < number:
-            self._state = Hint.Lower
-
-        if not self._testing:
-            print(self._state)
+            .format(number, range_min, range_max))
 
+        self._state = _HINTS_BY_SIGN[(secret > number) - (secret < number)]
         return self._state
 
 
@@ -96,6 +119,8 @@ class GuessingGameAi:
     This class is predefined - do not change it.
     """
 
+    default_max_guesses = 10000
+
     def __init__(self, game: GuessingGame):
         assert isinstance(game, GuessingGame)
 
@@ -109,6 +134,13 @@ class GuessingGameAi:
         """Analyse the hint given by the game."""
         pass
 
+    def reset(self):
+        """Forget everything learned in the current game, so that a new game can be played.
+
+        By default this initializes the AI again with the same game.
+        """
+        self.__init__(self.game)
+
     def generate_guesses_until_hit(self, max_guesses: int = None) -> typing.Optional[int]:
         """Try to guess unil win, or until maximum number of guesses is performed.
 
@@ -118,14 +150,16 @@ class GuessingGameAi:
         Default limit of guesses is 10000.
         """
         if max_guesses is None:
-            max_guesses = 10000
+            max_guesses = self.default_max_guesses
 
         assert isinstance(max_guesses, int)
         assert max_guesses > 0
 
+        # pylint: disable=protected-access
+        game_guess = self.game._guess_core if self.game._testing else self.game.guess
         for guess_no in range(max_guesses):
             guess = self.generate_guess()
-            hint = self.game.guess(guess)
+            hint = game_guess(guess)
             if self.game.is_over():
                 return guess_no + 1
             self.receive_hint(hint)
@@ -174,6 +208,37 @@ class SequencingAi(GuessingGameAi):
         pass
 
 
+class HintedSequencingAi(SequencingAi):
+
+    """HintedSequencingAi is a kind of SequencingAi which does not ignore the hints.
+
+    It tries guessing the number from minimum in increasing order, but it doubles the step
+    each time the number is higher. Once it goes too far, it bisects the remaining range.
+    """
+
+    def __init__(self, game):
+        super().__init__(game)
+        self.lower, self.upper = game.number_range()
+        self.step = 1
+        self.overshot = False
+
+    def generate_guess(self) -> int:
+        return self.curr_number
+
+    def receive_hint(self, hint: Hint):
+        guess = self.curr_number
+        if hint is Hint.Higher:
+            self.lower = guess + 1
+        elif hint is Hint.Lower:
+            self.upper = guess
+            self.overshot = True
+        if self.overshot:
+            self.curr_number = (self.lower + self.upper) // 2
+        else:
+            self.step *= 2
+            self.curr_number = min(guess + self.step, self.upper - 1)
+
+
 class SignedSequencingAi(GuessingGameAi):
 
     """SignedSequencingAi is a kind of GuessingGameAi as well.
@@ -184,20 +249,14 @@ class SignedSequencingAi(GuessingGameAi):
     def __init__(self, game):
         super().__init__(game)
         self.curr_number = sum(game.number_range()) // 2
-        self.sign = None
+        self.sign = 0
 
     def generate_guess(self) -> int:
-        if self.sign == '+':
-            self.curr_number += 1
-        elif self.sign == '-':
-            self.curr_number -= 1
+        self.curr_number += self.sign
         return self.curr_number
 
     def receive_hint(self, hint: Hint):
-        if hint is Hint.Higher:
-            self.sign = '+'
-        if hint is Hint.Lower:
-            self.sign = '-'
+        self.sign = _HINT_SIGNS[hint] or self.sign
 
 
 class OptimalAi(GuessingGameAi):
@@ -235,6 +294,71 @@ class OptimalAi(GuessingGameAi):
             else (self.lower, self.number - 1)
 
 
+def _simulate_stupid(range_min, range_max, trials, max_guesses, rng):
+    """Simulate games of StupidAi and return numbers of guesses, -1 marks failures.
+
+    Every guess hits with the same probability, so the number of guesses is drawn directly
+    from the geometric distribution.
+    """
+    results = rng.geometric(1.0 / (range_max - range_min), size=trials)
+    results[results > max_guesses] = -1
+    return results
+
+
+def _simulate_sequencing(range_min, range_max, secrets, max_guesses):
+    """Simulate games of SequencingAi and return numbers of guesses, -1 marks failures.
+
+    Guesses go up one by one from the minimum, so the number of guesses follows from the secret.
+    """
+    results = secrets - range_min + 1
+    results[results > max_guesses] = -1
+    return results
+
+
+def _simulate_signed_sequencing(range_min, range_max, secrets, max_guesses):
+    """Simulate games of SignedSequencingAi and return numbers of guesses, -1 marks failures.
+
+    Guesses go from the middle one by one towards the secret, so the number of guesses follows
+    from the distance between them.
+    """
+    results = np.abs(secrets - (range_min + range_max) // 2) + 1
+    results[results > max_guesses] = -1
+    return results
+
+
+@functools.lru_cache()
+def _optimal_guess_counts(range_min, range_max):
+    """Return array with numbers of guesses OptimalAi needs to find each number in given range.
+
+    Bisection is deterministic, so the tree of its guesses is walked only once - the depth
+    at which a number is guessed is the number of guesses needed to find it.
+    """
+    counts = np.zeros(range_max - range_min, dtype=np.int32)
+    pending = [(range_min, range_max, 1)]
+    while pending:
+        lower, upper, depth = pending.pop()
+        guess = (lower + upper) // 2
+        counts[guess - range_min] = depth
+        for lower, upper in ((lower, guess - 1), (guess + 1, upper)):
+            if lower <= min(upper, range_max - 1):
+                pending.append((lower, upper, depth + 1))
+    return counts
+
+
+def _simulate_optimal(range_min, range_max, secrets, max_guesses):
+    """Simulate games of OptimalAi and return numbers of guesses, -1 marks failures."""
+    results = _optimal_guess_counts(range_min, range_max)[secrets - range_min]
+    results[results > max_guesses] = -1
+    return results
+
+
+@functools.lru_cache()
+def _log2_curve(x_max):
+    """Return x and y values of log2 plot up to given x."""
+    x_values = np.arange(1.0, x_max, 0.1)
+    return x_values, np.log2(x_values)
+
+
 class GuessingGameAiTester:
 
     """Tester for guessing game AI systems."""
@@ -245,44 +369,146 @@ class GuessingGameAiTester:
         (3, 5), (10, 16), (0, 10), (-10, 5), (100, 120), (-25, 0), (1000, 1030), (0, 40),
         (-100, -50)]
 
-    colors = ['blue', 'gold', 'black', 'violet']
+    colors = ['blue', 'gold', 'black', 'violet', 'cyan']
+
+    # fast simulations of deterministic predefined AIs, they give the same results as the AIs
+    # themselves, and StupidAi is simulated separately because it needs random generator
+    _simulations = {
+        SequencingAi: _simulate_sequencing,
+        SignedSequencingAi: _simulate_signed_sequencing,
+        OptimalAi: _simulate_optimal}
+
+    # results of slow tests, shared by all testers and kept in least recently used order
+    _results_cache = collections.OrderedDict()  # type: typing.MutableMapping[tuple, np.ndarray]
+    _results_cache_size = 512
+    _results_cache_min_seconds = 0.01
+
+    def __init__(
+            self, ai_classes: typing.List[type],  # pylint: disable=invalid-sequence-index
+            parallel: bool = False, rng: np.random.Generator = None, cache: bool = False):
+        """Initialize tester for given AI classes.
+
+        If parallel is True, tests are run in a pool of processes. Then, AI classes must be
+        picklable, which may not be the case for classes defined in a notebook on some systems.
 
-    def __init__(self, ai_classes: typing.List[type]):  # pylint: disable=invalid-sequence-index
+        Random numbers used by the tester come from rng, which is a new generator by default.
+
+        If cache is True, results of slow tests are cached and reused by other testers that also
+        use the cache, as long as the AI class, the range and the number of trials are the same.
+        Cached results do not reflect later changes to code which the AI class depends on, use
+        clear_cache() to forget them.
+        """
         assert all([issubclass(ai_class, GuessingGameAi) for ai_class in ai_classes])
+        assert isinstance(parallel, bool)
+        assert isinstance(cache, bool)
+        if rng is None:
+            rng = np.random.default_rng()
+        assert isinstance(rng, np.random.Generator)
 
         self._ai_classes = ai_classes
+        self._parallel = parallel
+        self._rng = rng
+        self._use_cache = cache
         self.all_results_mappings = None
 
-    def _run_test(self, ai_class, range_min, range_max):
-        results = []  # type: typing.Optional[typing.List[int]]
-        for _ in range(self.trials):
-            game = GuessingGame(range_min, range_max, testing=True)
-            guessing_ai = ai_class(game)
+    @classmethod
+    def clear_cache(cls):
+        """Forget all cached test results."""
+        cls._results_cache.clear()
+
+    @staticmethod
+    def _simulated_results(results):
+        if (results == -1).any():
+            return None
+        return results.astype(np.int32)
+
+    @classmethod
+    def _run_test(cls, ai_class, range_min, range_max, trials, rng):
+        max_guesses = GuessingGameAi.default_max_guesses
+        if ai_class is StupidAi:
+            return cls._simulated_results(
+                _simulate_stupid(range_min, range_max, trials, max_guesses, rng))
+        secrets = rng.integers(range_min, range_max, size=trials)
+        simulation = cls._simulations.get(ai_class)
+        if simulation is not None:
+            return cls._simulated_results(simulation(range_min, range_max, secrets, max_guesses))
+        secrets = secrets.tolist()
+        results = np.empty(trials, dtype=np.int32)
+        game = GuessingGame(range_min, range_max, testing=True)
+        guessing_ai = ai_class(game)
+        for trial, secret in enumerate(secrets):
+            game.reset(secret)
+            if trial > 0:
+                guessing_ai.reset()
             result = guessing_ai.generate_guesses_until_hit()
             if result is None:
                 return None
-            results.append(result)
+            results[trial] = result
+        return results
+
+    @classmethod
+    def _run_timed_test(cls, *args):
+        start = time.perf_counter()
+        results = cls._run_test(*args)
+        return results, time.perf_counter() - start
+
+    def _store_results(self, key, results, seconds):
+        """Cache results of a successful test if it took long enough, and return them."""
+        if not self._use_cache or results is None or seconds < self._results_cache_min_seconds:
+            return results
+        results.flags.writeable = False
+        self._results_cache[key] = results
+        if len(self._results_cache) > self._results_cache_size:
+            self._results_cache.popitem(last=False)
         return results
 
-    def _run_tests(self, ai_class):
-        results_mapping = {}  # type: typing.Mapping[int, typing.Optional[typing.List[int]]]
+    def _run_tests(self, ai_class, executor=None):
+        """Run tests of given AI class for all ranges.
+
+        If executor is given, tests are only submitted to it, and futures are returned as results.
+        """
+        results_mapping = {}  # type: typing.Mapping[int, typing.Optional[np.ndarray]]
         for range_min, range_max in self.ranges:
-            results_mapping[range_max - range_min] = self._run_test(ai_class, range_min, range_max)
+            key = (ai_class, range_min, range_max, self.trials)
+            if self._use_cache and key in self._results_cache:
+                self._results_cache.move_to_end(key)
+                results_mapping[range_max - range_min] = self._results_cache[key]
+                continue
+            # each test gets its own generator, so that worker processes do not share random state
+            args = (
+                ai_class, range_min, range_max, self.trials,
+                np.random.default_rng(self._rng.integers(2 ** 63)))
+            if executor is None:
+                results = self._store_results(key, *self._run_timed_test(*args))
+            else:
+                results = executor.submit(self._run_timed_test, *args)
+            results_mapping[range_max - range_min] = results
         return results_mapping
 
     def run_tests(self):
         """Run extensive tests for AI classes."""
         self.all_results_mappings = collections.OrderedDict()
-        for ai_class in self._ai_classes:
-            results_mapping = self._run_tests(ai_class)
-            self.all_results_mappings[ai_class] = results_mapping
-
-    def _plot_results(self, ai_class, results_mapping, color):
+        if not self._parallel:
+            for ai_class in self._ai_classes:
+                self.all_results_mappings[ai_class] = self._run_tests(ai_class)
+            return
+
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            for ai_class in self._ai_classes:
+                self.all_results_mappings[ai_class] = self._run_tests(ai_class, executor)
+            for ai_class, results_mapping in self.all_results_mappings.items():
+                for range_min, range_max in self.ranges:
+                    results = results_mapping[range_max - range_min]
+                    if isinstance(results, concurrent.futures.Future):
+                        key = (ai_class, range_min, range_max, self.trials)
+                        results_mapping[range_max - range_min] = self._store_results(
+                            key, *results.result())
+
+    def _plot_results(self, axes, ai_class, results_mapping, color):
         assert ai_class in self._ai_classes
         assert color in self.colors
 
-        sorted_mapping = sorted(results_mapping.items())
-        x_values, y_values = zip(*sorted_mapping)
+        x_values, y_values = zip(*sorted(results_mapping.items()))
 
         line_style = {
             'color': color
@@ -295,53 +521,48 @@ class GuessingGameAiTester:
             'medianprops': {**line_style},
             'meanprops': {**line_style}
             }
-        pylab.boxplot(y_values, positions=x_values, **plot_properties)
+        axes.boxplot(y_values, positions=x_values, **plot_properties)
 
-        averages = [
-            functools.reduce(operator.add, [n / len(results) for n in results])
-            for results in y_values]
+        averages = [float(np.mean(results)) for results in y_values]
         line_style = {
             'linewidth': 0,
             'marker': 'o',
             'color': color
             }
         label = 'average guesses of {}'.format(ai_class.__name__)
-        pylab.plot(x_values, averages, label=label, **line_style)
+        axes.plot(x_values, averages, label=label, **line_style)
 
-    def _format_plot(self):
-        x_values = sorted([b - a for a, b in self.ranges])
+    def _format_plot(self, axes):
+        x_max = max(b - a for a, b in self.ranges)
 
         line_style = {
             'linewidth': 2,
             'color': 'green'
             }
-        pylab.plot(
-            np.arange(1, max(x_values), 0.1),
-            [math.log2(n) for n in np.arange(1.0, max(x_values), 0.1)],
-            label='log2 of guessing range', **line_style)
+        axes.plot(*_log2_curve(x_max), label='log2 of guessing range', **line_style)
 
         line_style = {
             'linewidth': 2,
             'color': 'red'
             }
-        pylab.plot(
-            range(max(x_values) + 1), range(max(x_values) + 1),
-            label='linear with guessing range', **line_style)
+        linear_values = np.arange(x_max + 1)
+        axes.plot(linear_values, linear_values, label='linear with guessing range', **line_style)
 
-        pylab.legend(loc='upper left', framealpha=0.8)
-        pylab.title(
+        axes.legend(loc='upper left', framealpha=0.8)
+        axes.set_title(
             'Testing guessing quality of: {}'
             .format(', '.join([ai_class.__name__ for ai_class in self._ai_classes])))
-        pylab.xlim(xmin=0.0, xmax=1.0 + max(x_values))
-        pylab.xlabel('range size')
-        pylab.ylim(ymin=0.0, ymax=5.0 + max(x_values))
-        pylab.ylabel('number of guesses until success')
+        axes.set_xlim(left=0.0, right=1.0 + x_max)
+        axes.set_xlabel('range size')
+        axes.set_ylim(bottom=0.0, top=5.0 + x_max)
+        axes.set_ylabel('number of guesses until success')
 
     def plot_results(self):
-        """Plot results about AIs accuracy."""
+        """Plot results about AIs accuracy in a new figure."""
+        _, axes = plt.subplots()
         for ai_class, color in zip(self._ai_classes, self.colors):
-            self._plot_results(ai_class, self.all_results_mappings[ai_class], color)
-        self._format_plot()
+            self._plot_results(axes, ai_class, self.all_results_mappings[ai_class], color)
+        self._format_plot(axes)
 
     def run_tests_and_plot_results(self):
         """Run extensive tests for AIs and plot results about their accuracy."""